@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Garbage-collect and compact video_info.json against the current rows.
+
+Steps:
+  1. Compact: re-key entries whose key is not in normalize_url() form, and
+     seed live URLs that have no entry from an equivalent key (same YouTube
+     video id / Twitch VOD id) instead of refetching them.
+  2. Mark: every normalized URL referenced by out.json is live.
+  3. Sweep with eviction policies:
+       - source:  entries whose source is in GC_EVICT_SOURCES and were fetched
+                  more than GC_SOURCE_MIN_AGE_DAYS ago (live ones are refetched
+                  on the next enrich run)
+       - age:     any entry fetched more than GC_MAX_AGE_DAYS ago (0 = off)
+       - unreferenced: entries no row references, once GC_GRACE_DAYS have
+                  passed since they were last referenced
+       - size:    if more than GC_MAX_ENTRIES remain (0 = off), unreferenced
+                  entries are evicted least-recently-referenced first
+  4. Report reclaimed entries per reason and bytes saved.
+
+Unreferenced entries kept by the grace period carry a "last_referenced"
+timestamp (the first run that found them unreferenced); it is dropped again
+when a row references them.
+
+Config via env:
+  OUT_DIR=/out
+  ROWS_FORMAT=json  (ndjson -> IN_JSON defaults to out.ndjson)
+  IN_JSON=out.json
+  CACHE_JSON=video_info.json
+  GC_GRACE_DAYS=0
+  GC_MAX_AGE_DAYS=0
+  GC_EVICT_SOURCES=error
+  GC_SOURCE_MIN_AGE_DAYS=1
+  GC_MAX_ENTRIES=0
+  DRY_RUN=0
+"""
+
+import os
+import json
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+
+from video_enrich import (
+    IN_PATH,
+    CACHE_PATH,
+    VIDEO_LINK_FIELDS,
+    load_json,
+    save_json,
+    normalize_url,
+    is_youtube,
+    youtube_video_id,
+    twitch_vod_id,
+)
+from rows_io import iter_rows
+
+
+GC_GRACE_DAYS = float(os.environ.get("GC_GRACE_DAYS", "0"))
+GC_MAX_AGE_DAYS = float(os.environ.get("GC_MAX_AGE_DAYS", "0"))
+GC_EVICT_SOURCES = {
+    s.strip() for s in os.environ.get("GC_EVICT_SOURCES", "error").split(",") if s.strip()
+}
+GC_SOURCE_MIN_AGE_DAYS = float(os.environ.get("GC_SOURCE_MIN_AGE_DAYS", "1"))
+GC_MAX_ENTRIES = int(os.environ.get("GC_MAX_ENTRIES", "0"))
+DRY_RUN = os.environ.get("DRY_RUN", "0") not in {"0", "false", "no", ""}
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def parse_ts(value) -> datetime | None:
+    if not isinstance(value, str) or not value.strip():
+        return None
+    try:
+        return datetime.strptime(value.strip(), "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def cache_bytes(cache: dict) -> int:
+    # Same serialization as save_json()
+    return len(json.dumps(cache, ensure_ascii=False, indent=2, sort_keys=True).encode("utf-8"))
+
+
+def video_identity(url: str) -> str | None:
+    if is_youtube(url):
+        vid = youtube_video_id(url)
+        return f"youtube:{vid}" if vid else None
+    vid = twitch_vod_id(url)
+    return f"twitch:{vid}" if vid else None
+
+
+def is_better(a: dict, b: dict) -> bool:
+    """True if entry a should win over b when two keys collapse into one."""
+    def rank(info):
+        return (
+            info.get("source") != "error",
+            bool(info.get("title")),
+            bool(info.get("thumbnail")),
+            info.get("fetched_at") or "",
+        )
+    return rank(a) > rank(b)
+
+
+def live_urls(rows) -> set[str]:
+    live = set()
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        for field in VIDEO_LINK_FIELDS:
+            url = normalize_url(str(row.get(field, "") or ""))
+            if url:
+                live.add(url)
+    return live
+
+
+def compact(cache: dict, live: set[str], report: Counter) -> dict:
+    out = {}
+    for key, info in cache.items():
+        if not isinstance(info, dict):
+            report["invalid"] += 1
+            continue
+        canon = normalize_url(key) or key
+        if canon != key:
+            report["rekeyed"] += 1
+        if canon in out:
+            report["duplicate"] += 1
+            if not is_better(info, out[canon]):
+                continue
+        out[canon] = info
+
+    by_identity = {}
+    for key, info in out.items():
+        ident = video_identity(key)
+        if ident and (ident not in by_identity or is_better(info, out[by_identity[ident]])):
+            by_identity[ident] = key
+
+    for url in sorted(live - out.keys()):
+        ident = video_identity(url)
+        if ident in by_identity:
+            out[url] = dict(out[by_identity[ident]])
+            report["seeded"] += 1
+    return out
+
+
+def sweep(cache: dict, live: set[str], now: datetime, report: Counter) -> dict:
+    now_ts = now.strftime("%Y-%m-%dT%H:%M:%SZ")
+    kept = {}
+    for url, info in cache.items():
+        fetched = parse_ts(info.get("fetched_at")) or _EPOCH
+        age = now - fetched
+
+        if info.get("source") in GC_EVICT_SOURCES and age >= timedelta(days=GC_SOURCE_MIN_AGE_DAYS):
+            report["source"] += 1
+            continue
+        if GC_MAX_AGE_DAYS and age >= timedelta(days=GC_MAX_AGE_DAYS):
+            report["age"] += 1
+            continue
+
+        if url in live:
+            info.pop("last_referenced", None)
+        else:
+            last_ref = parse_ts(info.get("last_referenced"))
+            if last_ref is None:
+                last_ref = now
+                info["last_referenced"] = now_ts
+            if now - last_ref >= timedelta(days=GC_GRACE_DAYS):
+                report["unreferenced"] += 1
+                continue
+        kept[url] = info
+
+    if GC_MAX_ENTRIES and len(kept) > GC_MAX_ENTRIES:
+        # LRU by last reference; live entries are never evicted for size
+        dead = sorted(
+            (u for u in kept if u not in live),
+            key=lambda u: (kept[u].get("last_referenced") or "", kept[u].get("fetched_at") or ""),
+        )
+        for url in dead[:len(kept) - GC_MAX_ENTRIES]:
+            del kept[url]
+            report["size"] += 1
+        if len(kept) > GC_MAX_ENTRIES:
+            print(f"Warning: {len(kept)} live entries exceed GC_MAX_ENTRIES={GC_MAX_ENTRIES}")
+    return kept
+
+
+def main():
+    if not os.path.exists(IN_PATH):
+        raise SystemExit(f"{IN_PATH} not found; refusing to sweep without live rows")
+    cache = load_json(CACHE_PATH, default={})
+    if not isinstance(cache, dict):
+        raise SystemExit(f"{CACHE_PATH} must be a JSON object")
+
+    live = live_urls(iter_rows(IN_PATH))
+    if not live:
+        raise SystemExit(f"No video URLs found in {IN_PATH}; refusing to sweep everything")
+
+    before_entries = len(cache)
+    before_bytes = cache_bytes(cache)
+    report = Counter()
+
+    cache = compact(cache, live, report)
+    cache = sweep(cache, live, datetime.now(timezone.utc), report)
+
+    after_bytes = cache_bytes(cache)
+    reclaimed = before_entries - len(cache)
+    print(f"Live URLs: {len(live)}")
+    print(f"Entries: {before_entries} -> {len(cache)} (reclaimed {reclaimed})")
+    print(f"Bytes: {before_bytes} -> {after_bytes} (reclaimed {before_bytes - after_bytes})")
+    for reason in ("invalid", "rekeyed", "duplicate", "seeded", "source", "age", "unreferenced", "size"):
+        if report[reason]:
+            print(f"  {reason}: {report[reason]}")
+
+    if DRY_RUN:
+        print("DRY_RUN set; not writing", CACHE_PATH)
+        return
+    save_json(CACHE_PATH, cache)
+    print("Wrote:", CACHE_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,18 +6,48 @@ Skip rule:
   - Ignore Twitch URLs when all matching rows in data/out.json are:
     - Media type == "VOD⏳"
     - row date older than CUTOFF_MONTHS (default: 2)
+
+Audit mode (AUDIT=1):
+  Re-probe cached URLs to find videos that went private/deleted and Twitch
+  VODs that expired, using cheap requests with bounded parallelism:
+    - YouTube: oEmbed status (404 -> dead, 403 -> restricted/private,
+      400 -> unknown/malformed URL); a 401 (private or embedding disabled)
+      is settled with one watch-page fetch: private/unavailable markers ->
+      restricted, playable -> embed_disabled
+    - Twitch VOD: single-field GraphQL lookup (null video -> dead)
+  Never-audited URLs go first, then the stalest audits; ties go to the
+  newest rows. At most AUDIT_LIMIT URLs are probed per run, skipping ones
+  audited within AUDIT_MAX_AGE_DAYS. Results are saved to AUDIT_JSON every
+  AUDIT_SAVE_EVERY probes, so an interrupted audit keeps its progress.
+  Prints dead links ranked by row date and an overrides.json snippet;
+  embed-disabled videos are still watchable and are listed separately.
+
+  AUDIT_JSON=video_audit.json
+  AUDIT_WORKERS=8
+  AUDIT_LIMIT=200
+  AUDIT_MAX_AGE_DAYS=7
+  AUDIT_SAVE_EVERY=20
 """
 
 import os
+import re
 import json
+import time
 import calendar
-from datetime import datetime, date
+import threading
+from datetime import datetime, date, timezone, timedelta
 from collections import defaultdict
-from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse, parse_qs, urlencode, urlunparse, quote
+
+from profiling import StageProfiler
+from rows_io import iter_rows
 
 
 OUT_DIR = os.environ.get("OUT_DIR", "../data")
-IN_JSON = os.environ.get("IN_JSON", "out.json")
+ROWS_FORMAT = os.environ.get("ROWS_FORMAT", "json").lower()
+# Read whichever file pipeline.py wrote for ROWS_FORMAT unless IN_JSON says otherwise
+IN_JSON = os.environ.get("IN_JSON") or ("out.ndjson" if ROWS_FORMAT == "ndjson" else "out.json")
 CACHE_JSON = os.environ.get("CACHE_JSON", "video_info.json")
 VIDEO_LINK_FIELDS = [
     s.strip()
@@ -27,8 +57,26 @@ VIDEO_LINK_FIELDS = [
 SKIP_MEDIA_TYPE = os.environ.get("SKIP_MEDIA_TYPE", "VOD⏳")
 CUTOFF_MONTHS = int(os.environ.get("CUTOFF_MONTHS", "2"))
 
+AUDIT = os.environ.get("AUDIT", "0") not in {"0", "false", "no", ""}
+AUDIT_JSON = os.environ.get("AUDIT_JSON", "video_audit.json")
+AUDIT_WORKERS = int(os.environ.get("AUDIT_WORKERS", "8"))
+AUDIT_LIMIT = int(os.environ.get("AUDIT_LIMIT", "200"))
+AUDIT_MAX_AGE_DAYS = float(os.environ.get("AUDIT_MAX_AGE_DAYS", "7"))
+AUDIT_SAVE_EVERY = int(os.environ.get("AUDIT_SAVE_EVERY", "20"))
+TIMEOUT_SECS = int(os.environ.get("TIMEOUT_SECS", "20"))
+USER_AGENT = os.environ.get(
+    "USER_AGENT",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122 Safari/537.36"
+)
+TWITCH_GQL_URL = os.environ.get("TWITCH_GQL_URL", "https://gql.twitch.tv/gql")
+TWITCH_CLIENT_ID = os.environ.get("TWITCH_CLIENT_ID", "kimne78kx3ncx6brgo4mv6wki5h1ko")
+
+# Sources that already record the video as gone; nothing to re-check
+UNAVAILABLE_SOURCES = {"youtube_unavailable", "twitch_unavailable"}
+
 IN_PATH = os.path.join(OUT_DIR, IN_JSON)
 CACHE_PATH = os.path.join(OUT_DIR, CACHE_JSON)
+AUDIT_PATH = os.path.join(OUT_DIR, AUDIT_JSON)
 
 
 def load_json(path, default):
@@ -38,6 +86,13 @@ def load_json(path, default):
         return json.load(f)
 
 
+def save_json(path, obj):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
 def normalize_url(url: str) -> str:
     url = (url or "").strip()
     if not url:
@@ -86,6 +141,32 @@ def is_twitch(url: str) -> bool:
     return "twitch.tv" in urlparse(url).netloc.lower()
 
 
+def is_youtube(url: str) -> bool:
+    n = urlparse(url).netloc.lower()
+    return "youtube.com" in n or "youtu.be" in n
+
+
+_TWITCH_VOD_ID_RE = re.compile(r"/videos?/(\d+)")
+
+
+def twitch_vod_id(url: str) -> str | None:
+    if not is_twitch(url):
+        return None
+    m = _TWITCH_VOD_ID_RE.search(urlparse(url).path)
+    return m.group(1) if m else None
+
+
+def strip_t(url: str) -> str:
+    try:
+        u = urlparse(url)
+        q = parse_qs(u.query, keep_blank_values=False)
+        q.pop("t", None)
+        query = urlencode([(k, v) for k, vs in q.items() for v in vs])
+        return urlunparse(u._replace(query=query))
+    except Exception:
+        return url
+
+
 def parse_iso_date(value: str) -> date | None:
     if not value:
         return None
@@ -132,17 +213,214 @@ def is_blank(value) -> bool:
     return not (isinstance(value, str) and value.strip())
 
 
+def row_date(row: dict) -> date | None:
+    return parse_iso_date(row.get("Date")) or parse_iso_date(row.get("Added date"))
+
+
+_local = threading.local()
+
+
+def audit_session():
+    # Imported here so the plain cache check keeps working without requests installed
+    import requests
+
+    s = getattr(_local, "session", None)
+    if s is None:
+        s = requests.Session()
+        s.headers.update({"User-Agent": USER_AGENT})
+        _local.session = s
+    return s
+
+
+def probe_youtube(url: str) -> tuple[str, str]:
+    r = audit_session().get(
+        "https://www.youtube.com/oembed?url=" + quote(url, safe="") + "&format=json",
+        timeout=TIMEOUT_SECS,
+    )
+    if r.status_code == 200:
+        return "alive", "oembed 200"
+    if r.status_code == 404:
+        return "dead", "oembed 404"
+    if r.status_code == 403:
+        return "restricted", "oembed 403 (private)"
+    if r.status_code == 401:
+        # Private videos and embed-disabled ones both answer 401; the watch page tells them apart
+        return probe_youtube_watch(url)
+    if r.status_code == 400:
+        return "unknown", "oembed 400 (malformed or unsupported URL)"
+    return "unknown", f"oembed {r.status_code}"
+
+
+def probe_youtube_watch(url: str) -> tuple[str, str]:
+    # Same markers video_enrich uses to classify youtube_unavailable
+    from video_enrich import YOUTUBE_UNAVAILABLE_MARKERS
+
+    r = audit_session().get(url, headers={"Accept-Language": "en-US,en;q=0.9"}, timeout=TIMEOUT_SECS)
+    if r.status_code != 200:
+        return "unknown", f"oembed 401, watch page {r.status_code}"
+    if any(marker in r.text for marker in YOUTUBE_UNAVAILABLE_MARKERS):
+        return "restricted", "oembed 401, watch page private/unavailable"
+    # Playable on YouTube; only the inline player on the site is blocked
+    return "embed_disabled", "oembed 401 (embedding disabled)"
+
+
+def probe_twitch(vod_id: str) -> tuple[str, str]:
+    r = audit_session().post(
+        TWITCH_GQL_URL,
+        json={"query": f'query {{ video(id: "{vod_id}") {{ id status }} }}'},
+        headers={"Client-Id": TWITCH_CLIENT_ID},
+        timeout=TIMEOUT_SECS,
+    )
+    if r.status_code != 200:
+        return "unknown", f"gql {r.status_code}"
+    body = r.json()
+    data = body.get("data")
+    if not isinstance(data, dict):
+        return "unknown", "gql no data"
+    video = data.get("video")
+    if not isinstance(video, dict):
+        # A null next to GraphQL errors is a failed lookup, not a missing VOD
+        if body.get("errors"):
+            return "unknown", "gql error"
+        return "dead", "twitch vod not found"
+    return "alive", f"twitch status {video.get('status') or 'unknown'}"
+
+
+def probe_url(url: str) -> dict:
+    try:
+        if is_youtube(url):
+            status, detail = probe_youtube(url)
+        elif twitch_vod_id(url):
+            status, detail = probe_twitch(twitch_vod_id(url))
+        else:
+            status, detail = "unknown", "unsupported host"
+    except Exception as e:
+        status, detail = "unknown", f"error: {e}"
+    return {
+        "status": status,
+        "detail": detail,
+        "audited_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def audit_priority(url: str, audits: dict, url_rows: dict) -> tuple:
+    prev = audits.get(url)
+    audited_at = prev.get("audited_at", "") if isinstance(prev, dict) else ""
+    dates = [d for d in (row_date(r) for r in url_rows.get(url, [])) if d]
+    newest = max(dates) if dates else date.min
+    # Never-audited first (""), then oldest audit; newest rows first within each
+    return (audited_at, -newest.toordinal())
+
+
+def suggested_override(url: str, url_rows: dict) -> tuple[str, dict]:
+    raw = ""
+    for row in url_rows.get(url, []):
+        for field in VIDEO_LINK_FIELDS:
+            value = str(row.get(field, "") or "").strip()
+            if value and normalize_url(value) == url:
+                raw = value
+                break
+        if raw:
+            break
+    key = strip_t(raw or url)
+    vod_id = twitch_vod_id(url)
+    if vod_id:
+        reason = f"Twitch VOD {vod_id} unavailable; replace with YouTube mirror at matching timestamp"
+    else:
+        reason = "Video unavailable; replace with a mirror or re-upload"
+    return key, {"url": "", "reason": reason}
+
+
+def run_audit(cache: dict, url_rows: dict):
+    audits = load_json(AUDIT_PATH, default={})
+    if not isinstance(audits, dict):
+        raise SystemExit(f"{AUDIT_PATH} must be a JSON object")
+
+    now = datetime.now(timezone.utc)
+    fresh_after = (now - timedelta(days=AUDIT_MAX_AGE_DAYS)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    candidates = []
+    for url, info in cache.items():
+        if not isinstance(info, dict) or url not in url_rows:
+            continue
+        if info.get("source") in UNAVAILABLE_SOURCES:
+            continue
+        if all(should_skip_old_twitch_vod(r, url) for r in url_rows[url]):
+            continue
+        if not (is_youtube(url) or twitch_vod_id(url)):
+            continue
+        prev = audits.get(url)
+        # Inconclusive probes (network errors, odd status codes) are retried next run
+        if (
+            isinstance(prev, dict)
+            and prev.get("status") != "unknown"
+            and prev.get("audited_at", "") >= fresh_after
+        ):
+            continue
+        candidates.append(url)
+
+    candidates.sort(key=lambda u: audit_priority(u, audits, url_rows))
+    batch = candidates[:AUDIT_LIMIT] if AUDIT_LIMIT > 0 else candidates
+    print(f"Auditing {len(batch)} of {len(candidates)} due URLs with {AUDIT_WORKERS} workers")
+
+    with ThreadPoolExecutor(max_workers=max(1, AUDIT_WORKERS)) as pool:
+        futures = {pool.submit(probe_url, url): url for url in batch}
+        for i, fut in enumerate(as_completed(futures), 1):
+            audits[futures[fut]] = fut.result()
+            if AUDIT_SAVE_EVERY > 0 and i % AUDIT_SAVE_EVERY == 0:
+                save_json(AUDIT_PATH, audits)
+    save_json(AUDIT_PATH, audits)
+    print("Wrote:", AUDIT_PATH)
+
+    dead = []
+    no_embed = []
+    for url, result in audits.items():
+        if not isinstance(result, dict) or url not in url_rows:
+            continue
+        status = result.get("status")
+        if status not in ("dead", "restricted", "embed_disabled"):
+            continue
+        dates = [d for d in (row_date(r) for r in url_rows[url]) if d]
+        item = (max(dates) if dates else date.min, len(url_rows[url]), url, result)
+        (no_embed if status == "embed_disabled" else dead).append(item)
+
+    # Most visible first: newest rows, then most referenced
+    dead.sort(key=lambda item: (item[0], item[1]), reverse=True)
+    no_embed.sort(key=lambda item: (item[0], item[1]), reverse=True)
+
+    if no_embed:
+        print(f"Found {len(no_embed)} URLs with embedding disabled (still watchable on YouTube)")
+        for d, n_rows, url, _result in no_embed:
+            when = d.isoformat() if d != date.min else "undated"
+            print(f"- [embed_disabled] {when} {url} | rows: {n_rows}")
+
+    print(f"Found {len(dead)} dead or restricted URLs")
+    if not dead:
+        return
+
+    suggestions = {}
+    for d, n_rows, url, result in dead:
+        when = d.isoformat() if d != date.min else "undated"
+        print(f"- [{result['status']}] {when} {url} | {result.get('detail', '')} | rows: {n_rows}")
+        if result["status"] == "dead":
+            key, override = suggested_override(url, url_rows)
+            suggestions[key] = override
+
+    if suggestions:
+        print("Suggested overrides.json entries (fill in replacement url):")
+        print(json.dumps({"url_replacements": suggestions}, ensure_ascii=False, indent=2))
+
+
 def main():
-    rows = load_json(IN_PATH, default=[])
+    prof = StageProfiler("check_video_info", OUT_DIR)
+    prof.stage("load")
     cache = load_json(CACHE_PATH, default={})
 
-    if not isinstance(rows, list):
-        raise SystemExit(f"{IN_PATH} must be a JSON array")
     if not isinstance(cache, dict):
         raise SystemExit(f"{CACHE_PATH} must be a JSON object")
 
     url_rows = defaultdict(list)
-    for row in rows:
+    for row in iter_rows(IN_PATH):
         if not isinstance(row, dict):
             continue
         for field in VIDEO_LINK_FIELDS:
@@ -150,6 +428,7 @@ def main():
             if url:
                 url_rows[url].append(row)
 
+    prof.stage("check")
     total = len(cache)
     skipped = 0
     flagged = []
@@ -158,7 +437,7 @@ def main():
         if not isinstance(info, dict):
             continue
 
-        if info.get("source") == "youtube_unavailable":
+        if info.get("source") in UNAVAILABLE_SOURCES:
             skipped += 1
             continue
 
@@ -190,15 +469,18 @@ def main():
     print(f"Skipped {skipped} URLs by old {SKIP_MEDIA_TYPE} Twitch rule ({CUTOFF_MONTHS} months)")
     print(f"Found {len(flagged)} URLs missing title and/or thumbnail")
 
-    if not flagged:
-        return
-
     for item in flagged:
         print(
             f"- [{item['media_types']}] {item['url']} | missing: {item['missing']} "
             f"| source: {item['source']} | rows: {item['rows']}"
         )
 
+    if AUDIT:
+        prof.stage("audit")
+        run_audit(cache, url_rows)
+
+    prof.finish()
+
 
 if __name__ == "__main__":
     main()
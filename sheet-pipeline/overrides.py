@@ -0,0 +1,206 @@
+"""
+URL override rules from overrides.json, compiled once into lookup indexes.
+
+overrides.json:
+  {
+    "url_replacements": {                      # exact URL (also matched with ?t= stripped)
+      "<url>": {"url": "<replacement>", "reason": "..."}
+    },
+    "rules": [
+      {"id": "...", "match": {"twitch_vod": "2685519131"}, "url": "...", "reason": "..."},
+      {"match": {"youtube_id": "AbCdEf123"}, "url": "...", "reason": "..."},
+      {"match": {"prefix": "https://www.twitch.tv/videos/26"}, "url": "...", "reason": "..."},
+      {"match": {"channel": "ethotv", "before": "2025-01-01"}, "url": "...", "reason": "..."}
+    ]
+  }
+
+Match keys:
+  - twitch_vod / youtube_id: video id, hashed lookup
+  - prefix: URL prefix, checked once per distinct prefix length
+  - channel: Twitch channel from the URL path, or the row's Creator (case-insensitive).
+    Only Twitch links are rewritten unless the rule sets "host": "any"
+  - before / after (YYYY-MM-DD): optional row date bounds (Date, then Added date);
+    before is exclusive, after is inclusive. Usable with any key above.
+
+Precedence: exact URL, exact URL without t, video id, longest prefix, channel.
+Within a bucket the first rule (file order) whose date bounds pass wins.
+apply_overrides() returns the replacement and the label of the rule that fired.
+"""
+
+import re
+from datetime import datetime, date
+from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+
+
+_TWITCH_VOD_RE = re.compile(r"twitch\.tv/(?:([A-Za-z0-9_]+)/)?videos?/(\d+)", re.IGNORECASE)
+_TWITCH_CHANNEL_RE = re.compile(r"twitch\.tv/([A-Za-z0-9_]+)", re.IGNORECASE)
+_YOUTUBE_ID_RE = re.compile(
+    r"(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/)|youtu\.be/)([A-Za-z0-9_-]{6,})",
+    re.IGNORECASE,
+)
+_T_PARAM_RE = re.compile(r"[?&]t=")
+# Twitch paths that are not channel names
+_TWITCH_RESERVED = {"videos", "directory", "downloads", "p", "settings", "search"}
+
+
+def _url_strip_t(url: str) -> str:
+    try:
+        u = urlparse(url)
+        q = parse_qs(u.query, keep_blank_values=False)
+        q.pop("t", None)
+        query = urlencode([(k, v) for k, vs in q.items() for v in vs])
+        return urlunparse(u._replace(query=query))
+    except Exception:
+        return url
+
+
+def _parse_day(value) -> date | None:
+    if not value:
+        return None
+    s = str(value).strip()
+    try:
+        return datetime.fromisoformat(s[:-1] + "+00:00" if s.endswith("Z") else s).date()
+    except ValueError:
+        return None
+
+
+def _row_day(row: dict | None) -> date | None:
+    if not isinstance(row, dict):
+        return None
+    return _parse_day(row.get("Date")) or _parse_day(row.get("Added date"))
+
+
+def twitch_channel(url: str) -> str | None:
+    m = _TWITCH_VOD_RE.search(url)
+    if m and m.group(1):
+        return m.group(1).lower()
+    m = _TWITCH_CHANNEL_RE.search(url)
+    if m and m.group(1).lower() not in _TWITCH_RESERVED:
+        return m.group(1).lower()
+    return None
+
+
+def compile_overrides(data: dict) -> dict:
+    """Build lookup indexes from parsed overrides.json. Raises ValueError on bad rules."""
+    data = data if isinstance(data, dict) else {}
+    compiled = {
+        "exact": {},
+        "twitch_vod": {},
+        "youtube_id": {},
+        "prefix": {},
+        "prefix_lengths": [],
+        "channel": {},
+        "count": 0,
+    }
+
+    for src, entry in (data.get("url_replacements") or {}).items():
+        if not isinstance(entry, dict) or not entry.get("url"):
+            raise ValueError(f"url_replacements[{src!r}] needs a url")
+        compiled["exact"][src] = {
+            "id": f"url_replacements[{src}]",
+            "url": entry["url"],
+            "reason": entry.get("reason", ""),
+        }
+        compiled["count"] += 1
+
+    for i, rule in enumerate(data.get("rules") or []):
+        match = rule.get("match") if isinstance(rule, dict) else None
+        if not isinstance(match, dict) or not rule.get("url"):
+            raise ValueError(f"rules[{i}] needs a match object and a url")
+        compiled_rule = {
+            "id": rule.get("id") or f"rules[{i}]",
+            "url": rule["url"],
+            "reason": rule.get("reason", ""),
+            "before": _parse_day(match.get("before")),
+            "after": _parse_day(match.get("after")),
+            "host": str(match.get("host") or "twitch").lower(),
+        }
+        if compiled_rule["host"] not in ("twitch", "any"):
+            raise ValueError(f"rules[{i}] host must be \"twitch\" or \"any\"")
+        if match.get("twitch_vod"):
+            bucket, key = compiled["twitch_vod"], str(match["twitch_vod"])
+        elif match.get("youtube_id"):
+            bucket, key = compiled["youtube_id"], str(match["youtube_id"])
+        elif match.get("prefix"):
+            bucket, key = compiled["prefix"], str(match["prefix"])
+        elif match.get("channel"):
+            bucket, key = compiled["channel"], str(match["channel"]).strip().lower()
+        else:
+            raise ValueError(f"rules[{i}] match needs twitch_vod, youtube_id, prefix or channel")
+        bucket.setdefault(key, []).append(compiled_rule)
+        compiled["count"] += 1
+
+    compiled["prefix_lengths"] = sorted({len(p) for p in compiled["prefix"]}, reverse=True)
+    return compiled
+
+
+def _first_in_bounds(rules: list | None, day: date | None) -> dict | None:
+    for rule in rules or ():
+        if rule["before"] and not (day and day < rule["before"]):
+            continue
+        if rule["after"] and not (day and day >= rule["after"]):
+            continue
+        return rule
+    return None
+
+
+def find_override(url: str, row: dict | None, compiled: dict) -> dict | None:
+    if not url or not compiled or not compiled["count"]:
+        return None
+
+    exact = compiled["exact"]
+    if exact:
+        if url in exact:
+            return exact[url]
+        # Only parse URLs that actually carry a t= parameter
+        if _T_PARAM_RE.search(url):
+            base = _url_strip_t(url)
+            if base in exact:
+                return exact[base]
+
+    day = _row_day(row)
+
+    if compiled["twitch_vod"] or compiled["youtube_id"]:
+        m = _TWITCH_VOD_RE.search(url)
+        if m:
+            rule = _first_in_bounds(compiled["twitch_vod"].get(m.group(2)), day)
+            if rule:
+                return rule
+        m = _YOUTUBE_ID_RE.search(url)
+        if m:
+            rule = _first_in_bounds(compiled["youtube_id"].get(m.group(1)), day)
+            if rule:
+                return rule
+
+    prefixes = compiled["prefix"]
+    for n in compiled["prefix_lengths"]:
+        rule = _first_in_bounds(prefixes.get(url[:n]), day)
+        if rule:
+            return rule
+
+    channels = compiled["channel"]
+    if channels:
+        is_twitch_url = "twitch.tv" in url.lower()
+        keys = []
+        if is_twitch_url:
+            keys.append(twitch_channel(url))
+        if isinstance(row, dict):
+            keys.append(str(row.get("Creator", "") or "").strip().lower())
+        for key in keys:
+            candidates = [
+                r for r in channels.get(key or "", ())
+                if r["host"] != "twitch" or is_twitch_url
+            ]
+            rule = _first_in_bounds(candidates, day)
+            if rule:
+                return rule
+
+    return None
+
+
+def apply_overrides(url: str, row: dict | None, compiled: dict) -> tuple[str, str | None]:
+    """Return (url to use, id of the rule that fired or None)."""
+    rule = find_override(url, row, compiled)
+    if rule is None:
+        return url, None
+    return rule["url"], rule["id"]
@@ -2,18 +2,36 @@ import os
 import csv
 import json
 import re
-from datetime import datetime, date
-from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+import time
+import hashlib
+from collections import Counter
+from datetime import datetime, date, timedelta, timezone
 
 import requests
 from openpyxl import load_workbook
 from openpyxl.utils import get_column_letter
 
+from overrides import compile_overrides, apply_overrides
+from profiling import StageProfiler
+from rows_io import iter_rows, write_ndjson
+
 SHEET_ID = os.environ.get("SHEET_ID", "")
 OUT_DIR = os.environ.get("OUT_DIR", "/out")
 OVERRIDES_FILE = os.environ.get("OVERRIDES_FILE", "")
 START_ROW = int(os.environ.get("START_ROW", "5"))
 SHEET_NAME = os.environ.get("SHEET_NAME")  # optional; default = active sheet
+# json = pretty out.json (default); ndjson = compact out.ndjson for downstream stages
+ROWS_FORMAT = os.environ.get("ROWS_FORMAT", "json").lower()
+
+# full = export + parse the whole sheet (default)
+# incremental = export only the top INCR_ROWS rows and merge them into the previous output,
+#               with a full reconciliation pass every FULL_EVERY_HOURS
+EXTRACT_MODE = os.environ.get("EXTRACT_MODE", "full").lower()
+INCR_ROWS = int(os.environ.get("INCR_ROWS", "100"))
+INCR_LAST_COL = os.environ.get("INCR_LAST_COL", "Z").upper()
+INCR_ANCHOR_ROWS = int(os.environ.get("INCR_ANCHOR_ROWS", "3"))
+FULL_EVERY_HOURS = float(os.environ.get("FULL_EVERY_HOURS", "24"))
+EXTRACT_STATE_JSON = os.environ.get("EXTRACT_STATE_JSON", "extract_state.json")
 
 # Configure which columns contain linked text
 LINK_COL_1 = os.environ.get("LINK_COL_1", "F").upper()
@@ -27,37 +45,22 @@ LINK2_URL_HEADER  = os.environ.get("LINK2_URL_HEADER",  "ts 2 link")
 
 if not SHEET_ID:
     raise SystemExit("Missing SHEET_ID env var")
+if ROWS_FORMAT not in {"json", "ndjson"}:
+    raise SystemExit(f"Unsupported ROWS_FORMAT: {ROWS_FORMAT}")
+if EXTRACT_MODE not in {"full", "incremental"}:
+    raise SystemExit(f"Unsupported EXTRACT_MODE: {EXTRACT_MODE}")
 
 
 def load_overrides(out_dir: str, overrides_file: str) -> dict:
     path = overrides_file or os.path.join(out_dir, "overrides.json")
     if not os.path.exists(path):
-        return {}
+        return compile_overrides({})
     with open(path, "r", encoding="utf-8") as f:
         data = json.load(f)
-    return data.get("url_replacements", {})
-
-
-def _url_strip_t(url: str) -> str:
     try:
-        u = urlparse(url)
-        q = parse_qs(u.query, keep_blank_values=False)
-        q.pop("t", None)
-        query = urlencode([(k, v) for k, vs in q.items() for v in vs])
-        return urlunparse(u._replace(query=query))
-    except Exception:
-        return url
-
-
-def apply_url_override(url: str, replacements: dict) -> str:
-    if not url or not replacements:
-        return url
-    if url in replacements:
-        return replacements[url]["url"]
-    base = _url_strip_t(url)
-    if base in replacements:
-        return replacements[base]["url"]
-    return url
+        return compile_overrides(data)
+    except ValueError as e:
+        raise SystemExit(f"Invalid {path}: {e}")
 
 
 def cell_link(cell) -> str:
@@ -88,95 +91,258 @@ def json_default(o):
     return str(o)
 
 
-os.makedirs(OUT_DIR, exist_ok=True)
+def load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
 
-url_replacements = load_overrides(OUT_DIR, OVERRIDES_FILE)
-if url_replacements:
-    print(f"Loaded {len(url_replacements)} URL override(s) from overrides.json")
 
-xlsx_path = os.path.join(OUT_DIR, "sheet.xlsx")
-csv_path  = os.path.join(OUT_DIR, "out.csv")
-json_path = os.path.join(OUT_DIR, "out.json")
+def file_sha1(path: str) -> str:
+    if not os.path.exists(path):
+        return ""
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
 
-export_url = f"https://docs.google.com/spreadsheets/d/{SHEET_ID}/export?format=xlsx"
 
-print("Downloading:", export_url)
-r = requests.get(export_url, timeout=60)
-r.raise_for_status()
+def row_fingerprint(row: dict) -> str:
+    data = json.dumps(row, ensure_ascii=False, sort_keys=True, default=json_default)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:16]
 
-# If not public, you may get HTML back.
-ct = (r.headers.get("content-type") or "").lower()
-if "text/html" in ct and r.content.lstrip().startswith(b"<!"):
-    raise SystemExit("Got HTML (likely not public / needs auth).")
 
-with open(xlsx_path, "wb") as f:
-    f.write(r.content)
+def full_pass_reason(state: dict, prev_path: str, overrides_hash: str) -> str | None:
+    """Why an incremental run must do a full extraction instead (None = it may go incremental)."""
+    if not os.path.exists(prev_path):
+        return f"no previous {os.path.basename(prev_path)}"
+    if not state.get("head_fingerprints") or not state.get("last_full_at"):
+        return "no previous extraction state"
+    if state.get("overrides_hash") != overrides_hash:
+        return "overrides changed"
+    try:
+        last_full = datetime.strptime(state["last_full_at"], "%Y-%m-%dT%H:%M:%SZ")
+    except (TypeError, ValueError):
+        return "unreadable last_full_at"
+    if datetime.now(timezone.utc) - last_full.replace(tzinfo=timezone.utc) >= timedelta(hours=FULL_EVERY_HOURS):
+        return f"last full pass is older than {FULL_EVERY_HOURS:g}h"
+    return None
+
+
+def merge_tail(tail: list, tail_fps: list, prev_rows: list, head_fps: list) -> list | None:
+    """
+    Splice freshly extracted top rows onto the previous output.
+
+    The last few tail rows are the anchor: they must appear, in order, among
+    the remembered top-of-sheet fingerprints. Everything in the previous
+    output after the anchor is kept as-is. Returns None when no anchor is
+    found (more new rows than the window, or edits at the window edge).
+    """
+    n = min(INCR_ANCHOR_ROWS, len(tail_fps))
+    if not n:
+        return None
+    anchor = tail_fps[-n:]
+    for j in range(len(head_fps) - n + 1):
+        if head_fps[j:j + n] == anchor:
+            return tail + prev_rows[j + n:]
+    return None
+
+
+def download_workbook(url: str, xlsx_path: str, prof: StageProfiler):
+    print("Downloading:", url)
+    r = requests.get(url, timeout=60)
+    r.raise_for_status()
+
+    # If not public, you may get HTML back.
+    ct = (r.headers.get("content-type") or "").lower()
+    if "text/html" in ct and r.content.lstrip().startswith(b"<!"):
+        raise SystemExit("Got HTML (likely not public / needs auth).")
+
+    with open(xlsx_path, "wb") as f:
+        f.write(r.content)
+
+    prof.stage("workbook_load")
+    wb = load_workbook(xlsx_path, data_only=True)
+    if SHEET_NAME and SHEET_NAME in wb.sheetnames:
+        return wb[SHEET_NAME]
+    if SHEET_NAME and "range=" not in url:
+        raise SystemExit(f"Sheet {SHEET_NAME!r} not found")
+    # Range exports may rename the single exported sheet
+    return wb.active
+
+
+def extract_rows(ws, last_row: int, overrides: dict, fired: Counter) -> tuple[list, list]:
+    """Rows START_ROW..last_row as dicts, with URL overrides applied (counted in fired)."""
+    # Determine max used column
+    max_col = ws.max_column
+
+    # Read header row (row 1) for all columns
+    base_headers = []
+    for c in range(1, max_col + 1):
+        val = ws.cell(row=1, column=c).value
+        hdr = sanitize_header(str(val)) if val is not None else ""
+        if not hdr:
+            hdr = get_column_letter(c)  # fallback to A/B/C...
+        base_headers.append(hdr)
+
+    # Locate link columns
+    link_col1_idx = ws[f"{LINK_COL_1}1"].column
+    link_col2_idx = ws[f"{LINK_COL_2}1"].column
+
+    # Final headers: all non-link headers + (text,url) for each link column
+    final_headers = []
+    for i, hdr in enumerate(base_headers, start=1):
+        if i == link_col1_idx or i == link_col2_idx:
+            continue
+        final_headers.append(hdr)
 
-wb = load_workbook(xlsx_path, data_only=True)
-ws = wb[SHEET_NAME] if SHEET_NAME else wb.active
+    final_headers += [LINK1_TEXT_HEADER, LINK1_URL_HEADER, LINK2_TEXT_HEADER, LINK2_URL_HEADER]
 
-# Determine max used column
-max_col = ws.max_column
+    rows = []
+    for r_idx in range(START_ROW, last_row + 1):
+        out = {}
 
-# Read header row (row 1) for all columns
-base_headers = []
-for c in range(1, max_col + 1):
-    val = ws.cell(row=1, column=c).value
-    hdr = sanitize_header(str(val)) if val is not None else ""
-    if not hdr:
-        hdr = get_column_letter(c)  # fallback to A/B/C...
-    base_headers.append(hdr)
+        # Copy all non-link columns
+        for c in range(1, max_col + 1):
+            if c == link_col1_idx or c == link_col2_idx:
+                continue
+            hdr = base_headers[c - 1]
+            val = ws.cell(row=r_idx, column=c).value
+            out[hdr] = normalize_value(val)
 
-# Locate link columns
-link_col1_idx = ws[f"{LINK_COL_1}1"].column
-link_col2_idx = ws[f"{LINK_COL_2}1"].column
+        # Link columns (text + url)
+        c1 = ws[f"{LINK_COL_1}{r_idx}"]
+        c2 = ws[f"{LINK_COL_2}{r_idx}"]
 
-# Final headers: all non-link headers + (text,url) for each link column
-final_headers = []
-for i, hdr in enumerate(base_headers, start=1):
-    if i == link_col1_idx or i == link_col2_idx:
-        continue
-    final_headers.append(hdr)
+        t1 = normalize_value(c1.value)
+        u1 = cell_link(c1)
+        t2 = normalize_value(c2.value)
+        u2 = cell_link(c2)
 
-final_headers += [LINK1_TEXT_HEADER, LINK1_URL_HEADER, LINK2_TEXT_HEADER, LINK2_URL_HEADER]
+        u1, rule1 = apply_overrides(u1, out, overrides)
+        u2, rule2 = apply_overrides(u2, out, overrides)
+        fired.update(r for r in (rule1, rule2) if r)
 
-rows = []
-for r_idx in range(START_ROW, ws.max_row + 1):
-    out = {}
+        out[LINK1_TEXT_HEADER] = t1
+        out[LINK1_URL_HEADER]  = u1
+        out[LINK2_TEXT_HEADER] = t2
+        out[LINK2_URL_HEADER]  = u2
 
-    # Copy all non-link columns
-    for c in range(1, max_col + 1):
-        if c == link_col1_idx or c == link_col2_idx:
-            continue
-        hdr = base_headers[c - 1]
-        val = ws.cell(row=r_idx, column=c).value
-        out[hdr] = normalize_value(val)
+        # Skip fully empty rows
+        if any(v not in ("", None) for v in out.values()):
+            rows.append(out)
+
+    return final_headers, rows
+
+
+os.makedirs(OUT_DIR, exist_ok=True)
+
+prof = StageProfiler("pipeline", OUT_DIR)
+prof.stage("download")
 
-    # Link columns (text + url)
-    c1 = ws[f"{LINK_COL_1}{r_idx}"]
-    c2 = ws[f"{LINK_COL_2}{r_idx}"]
+overrides = load_overrides(OUT_DIR, OVERRIDES_FILE)
+if overrides["count"]:
+    print(f"Loaded {overrides['count']} URL override(s) from overrides.json")
+fired = Counter()
 
-    t1 = normalize_value(c1.value)
-    u1 = cell_link(c1)
-    t2 = normalize_value(c2.value)
-    u2 = cell_link(c2)
+xlsx_path = os.path.join(OUT_DIR, "sheet.xlsx")
+csv_path  = os.path.join(OUT_DIR, "out.csv")
+json_path = os.path.join(OUT_DIR, "out.json")
+ndjson_path = os.path.join(OUT_DIR, "out.ndjson")
+state_path = os.path.join(OUT_DIR, EXTRACT_STATE_JSON)
+overrides_hash = file_sha1(OVERRIDES_FILE or os.path.join(OUT_DIR, "overrides.json"))
 
-    out[LINK1_TEXT_HEADER] = t1
-    out[LINK1_URL_HEADER]  = apply_url_override(u1, url_replacements)
-    out[LINK2_TEXT_HEADER] = t2
-    out[LINK2_URL_HEADER]  = apply_url_override(u2, url_replacements)
+export_url = f"https://docs.google.com/spreadsheets/d/{SHEET_ID}/export?format=xlsx"
 
-    # Skip fully empty rows
-    if any(v not in ("", None) for v in out.values()):
-        rows.append(out)
+
+state = load_json(state_path, default={})
+if not isinstance(state, dict):
+    state = {}
+prev_path = ndjson_path if ROWS_FORMAT == "ndjson" else json_path
+incremental = EXTRACT_MODE == "incremental"
+if incremental:
+    reason = full_pass_reason(state, prev_path, overrides_hash)
+    if reason:
+        print(f"Full reconciliation pass: {reason}")
+        incremental = False
+
+rows = None
+unchanged = False
+if incremental:
+    end_row = START_ROW + INCR_ROWS - 1
+    sheet_prefix = f"'{SHEET_NAME}'!" if SHEET_NAME else ""
+    ws = download_workbook(f"{export_url}&range={sheet_prefix}A1:{INCR_LAST_COL}{end_row}", xlsx_path, prof)
+    prof.stage("rows")
+    final_headers, tail = extract_rows(ws, min(ws.max_row, end_row), overrides, fired)
+    tail_fps = [row_fingerprint(r) for r in tail]
+    head_fps = state.get("head_fingerprints") or []
+
+    if final_headers != state.get("headers"):
+        print("Headers changed; falling back to a full pass.")
+    elif tail_fps == head_fps[:len(tail_fps)] and len(tail_fps) == min(len(head_fps), INCR_ROWS):
+        print(f"Top {INCR_ROWS} rows unchanged; keeping {prev_path}")
+        unchanged = True
+    else:
+        # Always anchor, even on a short export: the xlsx dimension stops at the
+        # last non-empty row, so blank rows at the bottom of the window don't
+        # mean the sheet ends there
+        prev_rows = list(iter_rows(prev_path))
+        if len(prev_rows) != state.get("row_count"):
+            print(f"{prev_path} does not match the extraction state; falling back to a full pass.")
+        else:
+            rows = merge_tail(tail, tail_fps, prev_rows, head_fps)
+            if rows is None:
+                print("Could not anchor the recent rows in the previous output; falling back to a full pass.")
+            else:
+                print(f"Merged {len(tail)} recent rows into {len(rows) - len(tail)} previous rows")
+    if rows is None and not unchanged:
+        incremental = False
+        fired.clear()
+
+if not incremental:
+    if EXTRACT_MODE == "incremental":
+        prof.stage("download")
+    ws = download_workbook(export_url, xlsx_path, prof)
+    prof.stage("rows")
+    final_headers, rows = extract_rows(ws, ws.max_row, overrides, fired)
+    state["last_full_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+if unchanged:
+    prof.finish()
+    raise SystemExit(0)
+
+prof.stage("write")
+for rule_id, n in sorted(fired.items()):
+    print(f"Override {rule_id} replaced {n} link(s)")
 
 with open(csv_path, "w", newline="", encoding="utf-8") as f:
     w = csv.DictWriter(f, fieldnames=final_headers, extrasaction="ignore")
     w.writeheader()
     w.writerows(rows)
 
-with open(json_path, "w", encoding="utf-8") as f:
-    json.dump(rows, f, ensure_ascii=False, indent=2, default=json_default)
-
 print("Wrote:", csv_path)
-print("Wrote:", json_path)
+
+if ROWS_FORMAT == "ndjson":
+    write_ndjson(ndjson_path, list(dict.fromkeys(final_headers)), rows, default=json_default)
+    print("Wrote:", ndjson_path)
+else:
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(rows, f, ensure_ascii=False, indent=2, default=json_default)
+    print("Wrote:", json_path)
+
+# Drop the other format's file so no later stage can read stale rows from it
+stale_path = json_path if ROWS_FORMAT == "ndjson" else ndjson_path
+if os.path.exists(stale_path):
+    os.remove(stale_path)
+    print("Removed stale:", stale_path)
+
+# Remember the top of the sheet so the next incremental run can anchor its window
+state.update({
+    "headers": final_headers,
+    "head_fingerprints": [row_fingerprint(r) for r in rows[:INCR_ROWS]],
+    "overrides_hash": overrides_hash,
+    "row_count": len(rows),
+})
+with open(state_path + ".tmp", "w", encoding="utf-8") as f:
+    json.dump(state, f, ensure_ascii=False, indent=2)
+os.replace(state_path + ".tmp", state_path)
+
+prof.finish()
@@ -0,0 +1,154 @@
+"""
+Opt-in per-stage profiling for the pipeline scripts (stdlib only).
+
+Enable with PROFILE=1. Scripts mark stage boundaries:
+
+  prof = StageProfiler("video_enrich", OUT_DIR)
+  prof.stage("load")     # ends the previous stage, starts the next
+  ...
+  prof.finish()          # ends the last stage and prints the summary
+
+For each stage this writes to PROFILE_DIR:
+  - <script>-<stage>.prof       cProfile stats (python -m pstats, snakeviz, ...)
+  - <script>-<stage>.folded     sampled stacks in collapsed format
+                                (flamegraph.pl / speedscope / inferno)
+  - <script>-<stage>.alloc.txt  top allocation sites still held at stage end
+
+and prints wall time, peak traced memory and the top allocation site per stage.
+With PROFILE unset every call is a no-op.
+
+Config via env:
+  PROFILE=0
+  PROFILE_DIR=<script OUT_DIR>/profiles
+  PROFILE_TOP=15
+  PROFILE_INTERVAL_MS=5
+"""
+
+import os
+import sys
+import time
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+
+
+PROFILE = os.environ.get("PROFILE", "0") not in {"0", "false", "no", ""}
+# Unset = "profiles" under the OUT_DIR each script passes in
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "")
+PROFILE_TOP = int(os.environ.get("PROFILE_TOP", "15"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+
+
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _own_site(traceback) -> str:
+    """Innermost frame in the pipeline scripts, so json/openpyxl internals point back at the caller."""
+    for frame in reversed(traceback):
+        if os.path.dirname(os.path.abspath(frame.filename)) == _SCRIPT_DIR:
+            return f"{os.path.basename(frame.filename)}:{frame.lineno}"
+    frame = traceback[-1]
+    return f"{os.path.basename(frame.filename)}:{frame.lineno}"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into folded-stack counts."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class StageProfiler:
+    def __init__(self, script: str, out_dir: str):
+        self.script = script
+        self.profile_dir = PROFILE_DIR or os.path.join(out_dir, "profiles")
+        self.enabled = PROFILE
+        self.results = []
+        self._name = None
+
+    def stage(self, name: str):
+        self._end()
+        if not self.enabled:
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+        tracemalloc.reset_peak()
+        self._name = name
+        self._baseline = tracemalloc.take_snapshot()
+        self._sampler = _StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+        self._sampler.start()
+        self._profile = cProfile.Profile()
+        self._started = time.perf_counter()
+        self._profile.enable()
+
+    def _end(self):
+        if self._name is None:
+            return
+        self._profile.disable()
+        wall = time.perf_counter() - self._started
+        self._sampler.stop()
+        _, peak = tracemalloc.get_traced_memory()
+        ignore = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, threading.__file__),
+            tracemalloc.Filter(False, __file__, all_frames=True),
+        ]
+        snapshot = tracemalloc.take_snapshot().filter_traces(ignore)
+        baseline = self._baseline.filter_traces(ignore)
+        top = [
+            s for s in snapshot.compare_to(baseline, "traceback")
+            if s.size_diff > 0
+        ][:PROFILE_TOP]
+
+        base = os.path.join(self.profile_dir, f"{self.script}-{self._name}")
+        self._profile.dump_stats(base + ".prof")
+        with open(base + ".folded", "w", encoding="utf-8") as f:
+            for stack, n in self._sampler.counts.most_common():
+                f.write(f"{stack} {n}\n")
+        with open(base + ".alloc.txt", "w", encoding="utf-8") as f:
+            f.write(f"stage {self._name}: wall {wall:.3f}s, peak {peak / 1e6:.1f} MB\n")
+            for stat in top:
+                f.write(
+                    f"\n{_own_site(stat.traceback)}: +{stat.size_diff / 1024:.1f} KiB "
+                    f"in {stat.count_diff:+d} blocks\n"
+                )
+                for line in stat.traceback.format(limit=8, most_recent_first=True):
+                    f.write(f"  {line}\n")
+
+        top_site = _own_site(top[0].traceback) if top else "-"
+        self.results.append((self._name, wall, peak, top_site))
+        self._name = None
+
+    def finish(self):
+        self._end()
+        if not self.enabled or not self.results:
+            return
+        print(f"Profile ({self.script}) -> {self.profile_dir}")
+        for name, wall, peak, top_site in self.results:
+            print(f"  {name:<16} {wall:8.3f}s  peak {peak / 1e6:7.1f} MB  top alloc: {top_site}")
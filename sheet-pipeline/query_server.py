@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Load the enriched dataset into SQLite and serve read-only JSON queries.
+
+  python query_server.py build   # out.enriched.json + video_info.json -> videos.sqlite
+  python query_server.py serve   # HTTP/JSON on QUERY_HOST:QUERY_PORT
+
+build writes a fresh database next to the old one and swaps it in, so a
+running server never sees a half-built file.
+
+Tables:
+  videos      one row per enriched row; indexed on creator_key, month,
+              media_type, content_type. row_json keeps the raw row.
+  videos_fts  FTS5 over title, notes, creator, content_type (skipped if
+              this sqlite3 build lacks FTS5; q= then falls back to LIKE)
+  video_info  the metadata cache, one row per URL
+
+Endpoints (GET, JSON):
+  /videos?creator=&month=YYYY-MM&media_type=&content_type=&q=&limit=&offset=
+          -> {"total": n, "videos": [raw rows, newest first]}
+  /months    -> [{"month", "count"}]
+  /creators  -> [{"creator", "count"}]
+  /info?url= -> cached metadata for one URL (normalized like video_enrich)
+
+Config via env:
+  OUT_DIR=/out
+  OUT_JSON=out.enriched.json
+  CACHE_JSON=video_info.json
+  QUERY_DB=videos.sqlite
+  QUERY_HOST=127.0.0.1
+  QUERY_PORT=8088
+  QUERY_MAX_LIMIT=500
+"""
+
+import os
+import re
+import sys
+import json
+import sqlite3
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from video_enrich import (
+    OUT_DIR,
+    OUT_PATH,
+    CACHE_PATH,
+    VIDEO_LINK_FIELDS,
+    load_json,
+    normalize_url,
+    base_name_from_link_field,
+)
+
+
+QUERY_DB = os.environ.get("QUERY_DB", "videos.sqlite")
+QUERY_HOST = os.environ.get("QUERY_HOST", "127.0.0.1")
+QUERY_PORT = int(os.environ.get("QUERY_PORT", "8088"))
+QUERY_MAX_LIMIT = int(os.environ.get("QUERY_MAX_LIMIT", "500"))
+
+DB_PATH = os.path.join(OUT_DIR, QUERY_DB)
+
+SCHEMA = """
+CREATE TABLE videos (
+  id INTEGER PRIMARY KEY,
+  date TEXT NOT NULL,
+  month TEXT,
+  creator TEXT NOT NULL,
+  creator_key TEXT NOT NULL,
+  media_type TEXT NOT NULL,
+  content_type TEXT NOT NULL,
+  title TEXT NOT NULL,
+  notes TEXT NOT NULL,
+  link TEXT NOT NULL,
+  row_json TEXT NOT NULL
+);
+CREATE INDEX videos_creator_key ON videos (creator_key, date);
+CREATE INDEX videos_month ON videos (month, date);
+CREATE INDEX videos_media_type ON videos (media_type, date);
+CREATE INDEX videos_content_type ON videos (content_type, date);
+CREATE TABLE video_info (
+  url TEXT PRIMARY KEY,
+  title TEXT,
+  thumbnail TEXT,
+  source TEXT,
+  fetched_at TEXT,
+  info_json TEXT NOT NULL
+);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE videos_fts USING fts5(
+  title, notes, creator, content_type,
+  content='videos', content_rowid='id'
+);
+INSERT INTO videos_fts (rowid, title, notes, creator, content_type)
+  SELECT id, title, notes, creator, content_type FROM videos;
+"""
+
+_MONTH_RE = re.compile(r"^\d{4}-\d{2}")
+_FTS_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def text(value) -> str:
+    return str(value or "").strip()
+
+
+def row_month(date_value: str) -> str | None:
+    # Same rule as web/src/_data/videoGrouping.js: first 7 chars of Date
+    m = _MONTH_RE.match(date_value)
+    return m.group(0) if m else None
+
+
+def build():
+    enriched_output = load_json(OUT_PATH, default={})
+    rows = enriched_output.get("videos") if isinstance(enriched_output, dict) else None
+    if not isinstance(rows, list):
+        raise SystemExit(f"{OUT_PATH} must be a JSON object with a videos array")
+    cache = load_json(CACHE_PATH, default={})
+    if not isinstance(cache, dict):
+        raise SystemExit(f"{CACHE_PATH} must be a JSON object")
+
+    bases = [base_name_from_link_field(f) for f in VIDEO_LINK_FIELDS]
+    first_base = bases[0] if bases else "timestamp 1"
+
+    tmp = DB_PATH + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    con = sqlite3.connect(tmp)
+    try:
+        con.executescript(SCHEMA)
+        con.executemany(
+            "INSERT INTO videos (date, month, creator, creator_key, media_type, content_type,"
+            " title, notes, link, row_json) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    text(row.get("Date")),
+                    row_month(text(row.get("Date"))),
+                    text(row.get("Creator")),
+                    text(row.get("Creator")).lower(),
+                    text(row.get("Media type")),
+                    text(row.get("Content type")),
+                    " ".join(text(row.get(f"{b} title")) for b in bases).strip(),
+                    text(row.get("Notes")),
+                    text(row.get(f"{first_base} link")),
+                    json.dumps(row, ensure_ascii=False),
+                )
+                for row in rows
+                if isinstance(row, dict)
+            ),
+        )
+        con.executemany(
+            "INSERT INTO video_info (url, title, thumbnail, source, fetched_at, info_json)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    url,
+                    info.get("title"),
+                    info.get("thumbnail"),
+                    info.get("source"),
+                    info.get("fetched_at"),
+                    json.dumps(info, ensure_ascii=False, sort_keys=True),
+                )
+                for url, info in cache.items()
+                if isinstance(info, dict)
+            ),
+        )
+        try:
+            con.executescript(FTS_SCHEMA)
+            fts = True
+        except sqlite3.OperationalError:
+            fts = False
+        con.commit()
+        n_videos = con.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+        n_info = con.execute("SELECT COUNT(*) FROM video_info").fetchone()[0]
+    finally:
+        con.close()
+    os.replace(tmp, DB_PATH)
+
+    print(f"Loaded {n_videos} videos and {n_info} cache entries (full-text search: {'on' if fts else 'off'})")
+    print("Wrote:", DB_PATH)
+
+
+def connect_ro() -> sqlite3.Connection:
+    con = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+    con.row_factory = sqlite3.Row
+    return con
+
+
+def has_fts(con: sqlite3.Connection) -> bool:
+    return con.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'videos_fts'"
+    ).fetchone() is not None
+
+
+def fts_query(q: str) -> str | None:
+    # Quote every token and prefix-match it, so user input can't inject FTS syntax
+    tokens = _FTS_TOKEN_RE.findall(q)
+    return " ".join(f'"{t}"*' for t in tokens) or None
+
+
+def query_videos(con: sqlite3.Connection, params: dict) -> dict:
+    where, args = [], []
+    for param, column in (
+        ("creator", "creator_key"),
+        ("month", "month"),
+        ("media_type", "media_type"),
+        ("content_type", "content_type"),
+    ):
+        value = params.get(param)
+        if value:
+            where.append(f"v.{column} = ?")
+            args.append(value.strip().lower() if param == "creator" else value.strip())
+
+    q = (params.get("q") or "").strip()
+    if q:
+        match = fts_query(q)
+        if match and has_fts(con):
+            where.append("v.id IN (SELECT rowid FROM videos_fts WHERE videos_fts MATCH ?)")
+            args.append(match)
+        else:
+            where.append("(v.title LIKE ? OR v.notes LIKE ?)")
+            args += [f"%{q}%", f"%{q}%"]
+
+    clause = f"WHERE {' AND '.join(where)}" if where else ""
+    limit = min(max(int(params.get("limit") or 50), 1), QUERY_MAX_LIMIT)
+    offset = max(int(params.get("offset") or 0), 0)
+
+    total = con.execute(f"SELECT COUNT(*) FROM videos v {clause}", args).fetchone()[0]
+    rows = con.execute(
+        f"SELECT v.row_json FROM videos v {clause} ORDER BY v.date DESC, v.id LIMIT ? OFFSET ?",
+        args + [limit, offset],
+    ).fetchall()
+    return {"total": total, "videos": [json.loads(r["row_json"]) for r in rows]}
+
+
+def query_months(con: sqlite3.Connection, _params: dict) -> list:
+    rows = con.execute(
+        "SELECT month, COUNT(*) AS count FROM videos WHERE month IS NOT NULL"
+        " GROUP BY month ORDER BY month DESC"
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def query_creators(con: sqlite3.Connection, _params: dict) -> list:
+    rows = con.execute(
+        "SELECT MIN(creator) AS creator, COUNT(*) AS count FROM videos"
+        " GROUP BY creator_key ORDER BY count DESC, creator_key"
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def query_info(con: sqlite3.Connection, params: dict):
+    url = normalize_url(params.get("url") or "")
+    row = con.execute("SELECT info_json FROM video_info WHERE url = ?", (url,)).fetchone()
+    return json.loads(row["info_json"]) if row else None
+
+
+ROUTES = {
+    "/videos": query_videos,
+    "/months": query_months,
+    "/creators": query_creators,
+    "/info": query_info,
+}
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        handler = ROUTES.get(parsed.path.rstrip("/") or "/")
+        if handler is None:
+            self.send_json(404, {"error": "not found", "routes": sorted(ROUTES)})
+            return
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        # ThreadingHTTPServer uses a thread per request; a read-only open is cheap
+        con = connect_ro()
+        try:
+            result = handler(con, params)
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        finally:
+            con.close()
+        if result is None:
+            self.send_json(404, {"error": "not found"})
+            return
+        self.send_json(200, result)
+
+    def send_json(self, status: int, obj):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve():
+    if not os.path.exists(DB_PATH):
+        raise SystemExit(f"{DB_PATH} not found; run `python query_server.py build` first")
+    server = ThreadingHTTPServer((QUERY_HOST, QUERY_PORT), QueryHandler)
+    print(f"Serving {DB_PATH} on http://{QUERY_HOST}:{QUERY_PORT} ({', '.join(sorted(ROUTES))})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "build":
+        build()
+    elif command == "serve":
+        serve()
+    else:
+        raise SystemExit("usage: query_server.py build|serve")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Read and write the intermediate rows file passed between pipeline stages.
+
+  out.json    JSON array of row objects (ROWS_FORMAT=json)
+  out.ndjson  header line {"format": "etho-rows", "version": 1, "fields": [...]},
+              then one JSON array of values per row in field order (ROWS_FORMAT=ndjson)
+
+pipeline.py writes it (and reads it back for incremental merges); the
+downstream stages only read it. Stdlib only, so every script can import it.
+"""
+
+import os
+import json
+
+
+def write_ndjson(path: str, fields: list, rows: list, default=None):
+    # Header line carries the schema; each row is a bare array in field order
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        header = {"format": "etho-rows", "version": 1, "fields": fields}
+        f.write(json.dumps(header, ensure_ascii=False) + "\n")
+        for row in rows:
+            values = [row.get(k, "") for k in fields]
+            f.write(json.dumps(values, ensure_ascii=False, separators=(",", ":"), default=default) + "\n")
+    os.replace(tmp, path)
+
+
+def iter_rows(path):
+    """
+    Yield row dicts from out.json (JSON array) or out.ndjson (compact rows).
+
+    out.ndjson is read line by line, so rows never need to be held in memory at once.
+    """
+    if not os.path.exists(path):
+        return
+    if not path.endswith(".ndjson"):
+        with open(path, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+        if not isinstance(rows, list):
+            raise SystemExit(f"{path} must be a JSON array")
+        yield from rows
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        header = json.loads(f.readline() or "{}")
+        fields = header.get("fields") if isinstance(header, dict) else None
+        if header.get("format") != "etho-rows" or not isinstance(fields, list):
+            raise SystemExit(f"{path} is missing an etho-rows header line")
+        for line in f:
+            if line.strip():
+                yield dict(zip(fields, json.loads(line)))
+
+
+class _NdjsonRows:
+    """Re-iterable view of out.ndjson; every pass streams the file again."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        return iter_rows(self.path)
+
+
+def load_rows(path):
+    """
+    Rows for callers that walk them more than once. out.json is parsed once
+    into a list; out.ndjson stays on disk and is streamed on every pass.
+    """
+    if path.endswith(".ndjson"):
+        return _NdjsonRows(path)
+    return list(iter_rows(path))
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Build a compact, sharded search index from out.enriched.json.
+
+Runs after video_enrich.py. The browser loads the small term dictionary,
+resolves query tokens (including prefixes) to the months that contain them,
+and then fetches only those month shards.
+
+Inputs:
+  - /out/out.enriched.json
+
+Outputs (under /out/search/):
+  - terms.json      {"fields": [...], "terms": [[token, [month, ...]], ...], "months": {month: doc_count}}
+  - <YYYY-MM>.json  {"month": ..., "docs": [[field values...], ...], "postings": {token: [doc_idx, ...]}}
+
+Indexed text: link titles, Notes, Creator and Content type. Tokens are
+lower-cased, accent-folded runs of letters/digits (min length MIN_TOKEN_LEN).
+Rows without a usable Date/Added date go to the "undated" shard.
+
+Files are only rewritten when their content changes; shards for months
+that no longer exist are removed.
+
+Config via env:
+  OUT_DIR=/out
+  OUT_JSON=out.enriched.json
+  SEARCH_DIR=search
+  MIN_TOKEN_LEN=2
+"""
+
+import os
+import re
+import json
+import unicodedata
+
+from video_enrich import (
+    OUT_DIR,
+    OUT_PATH,
+    VIDEO_LINK_FIELDS,
+    load_json,
+    base_name_from_link_field,
+    parse_iso_date,
+)
+
+
+SEARCH_DIR = os.environ.get("SEARCH_DIR", "search")
+MIN_TOKEN_LEN = int(os.environ.get("MIN_TOKEN_LEN", "2"))
+
+SEARCH_PATH = os.path.join(OUT_DIR, SEARCH_DIR)
+TERMS_FILE = "terms.json"
+UNDATED_MONTH = "undated"
+
+# Order of values in each shard doc; stored once in terms.json
+DOC_FIELDS = ["title", "creator", "date", "mediaType", "contentType", "notes", "link", "thumbnail"]
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+
+
+def fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text) -> list[str]:
+    if not isinstance(text, str) or not text:
+        return []
+    return [t for t in _TOKEN_RE.findall(fold(text)) if len(t) >= MIN_TOKEN_LEN]
+
+
+def row_month(row: dict) -> str:
+    d = parse_iso_date(row.get("Date")) or parse_iso_date(row.get("Added date"))
+    return d.strftime("%Y-%m") if d else UNDATED_MONTH
+
+
+def row_doc(row: dict, first_base: str) -> list:
+    return [
+        str(row.get(f"{first_base} title", "") or ""),
+        str(row.get("Creator", "") or "").strip(),
+        str(row.get("Date", "") or ""),
+        str(row.get("Media type", "") or ""),
+        str(row.get("Content type", "") or ""),
+        str(row.get("Notes", "") or ""),
+        str(row.get(f"{first_base} link", "") or ""),
+        str(row.get(f"{first_base} thumbnail", "") or ""),
+    ]
+
+
+def row_tokens(row: dict, bases: list[str]) -> set[str]:
+    tokens = set()
+    for base in bases:
+        tokens.update(tokenize(row.get(f"{base} title")))
+    for field in ("Notes", "Creator", "Content type"):
+        tokens.update(tokenize(row.get(field)))
+    return tokens
+
+
+def build_index(rows: list) -> tuple[dict, dict]:
+    bases = [base_name_from_link_field(f) for f in VIDEO_LINK_FIELDS]
+    first_base = bases[0] if bases else "timestamp 1"
+
+    shards = {}
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        month = row_month(row)
+        shard = shards.setdefault(month, {"month": month, "docs": [], "postings": {}})
+        doc_idx = len(shard["docs"])
+        shard["docs"].append(row_doc(row, first_base))
+        for token in row_tokens(row, bases):
+            shard["postings"].setdefault(token, []).append(doc_idx)
+
+    terms = {}
+    for month in sorted(shards, reverse=True):
+        shard = shards[month]
+        shard["postings"] = {t: shard["postings"][t] for t in sorted(shard["postings"])}
+        for token in shard["postings"]:
+            terms.setdefault(token, []).append(month)
+
+    dictionary = {
+        "fields": DOC_FIELDS,
+        # A sorted array, not an object: JS reorders integer-like keys ("10", "2024")
+        # ahead of the rest, which would break a binary search over Object.keys()
+        "terms": [[t, terms[t]] for t in sorted(terms)],
+        "months": {m: len(shards[m]["docs"]) for m in sorted(shards, reverse=True)},
+    }
+    return dictionary, shards
+
+
+def write_if_changed(path: str, obj) -> bool:
+    data = json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            if f.read() == data:
+                return False
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return True
+
+
+def main():
+    enriched_output = load_json(OUT_PATH, default={})
+    rows = enriched_output.get("videos") if isinstance(enriched_output, dict) else None
+    if not isinstance(rows, list):
+        raise SystemExit(f"{OUT_PATH} must be a JSON object with a videos array")
+
+    dictionary, shards = build_index(rows)
+    os.makedirs(SEARCH_PATH, exist_ok=True)
+
+    written = 0
+    for month, shard in shards.items():
+        written += write_if_changed(os.path.join(SEARCH_PATH, f"{month}.json"), shard)
+    written += write_if_changed(os.path.join(SEARCH_PATH, TERMS_FILE), dictionary)
+
+    wanted = {f"{m}.json" for m in shards} | {TERMS_FILE}
+    removed = 0
+    for name in os.listdir(SEARCH_PATH):
+        if name.endswith(".json") and name not in wanted:
+            os.remove(os.path.join(SEARCH_PATH, name))
+            removed += 1
+
+    print(
+        f"Indexed {sum(len(s['docs']) for s in shards.values())} rows, "
+        f"{len(dictionary['terms'])} terms, {len(shards)} month shards."
+    )
+    print(f"Wrote {written} changed file(s), removed {removed} stale shard(s) in {SEARCH_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Mirror enriched thumbnails locally as small, content-addressed variants.
+
+Runs after video_enrich.py. Every thumbnail URL referenced by
+out.enriched.json is downloaded once, hashed, and re-encoded into a few
+resized WebP/JPEG variants named after the content hash. Variant paths and
+dimensions are written back into out.enriched.json next to the original
+thumbnail URL.
+
+Inputs:
+  - /out/out.enriched.json
+  - /out/thumb_index.json  (source url -> mirrored variants; created if missing)
+
+Outputs:
+  - /out/thumbs/<hash>-<width>.<ext>
+  - /out/thumb_index.json  (updated)
+  - /out/out.enriched.json (adds "<base> thumbnail variants" fields)
+
+Already-mirrored URLs (index entry present and every variant file on disk)
+are not downloaded again. Identical images served from different URLs
+share the same files.
+
+Config via env:
+  OUT_DIR=/out
+  OUT_JSON=out.enriched.json
+  THUMB_DIR=thumbs
+  THUMB_INDEX_JSON=thumb_index.json
+  THUMB_WIDTHS="320,640"
+  THUMB_FORMATS="webp,jpeg"
+  THUMB_QUALITY=80
+  THUMB_WORKERS=4
+"""
+
+import os
+import io
+import time
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from PIL import Image
+
+from video_enrich import (
+    OUT_DIR,
+    OUT_PATH,
+    VIDEO_LINK_FIELDS,
+    TIMEOUT_SECS,
+    USER_AGENT,
+    load_json,
+    save_json,
+    base_name_from_link_field,
+)
+
+
+THUMB_DIR = os.environ.get("THUMB_DIR", "thumbs")
+THUMB_INDEX_JSON = os.environ.get("THUMB_INDEX_JSON", "thumb_index.json")
+THUMB_WIDTHS = sorted({
+    int(s) for s in os.environ.get("THUMB_WIDTHS", "320,640").split(",") if s.strip()
+})
+THUMB_FORMATS = [
+    s.strip().lower()
+    for s in os.environ.get("THUMB_FORMATS", "webp,jpeg").split(",")
+    if s.strip()
+]
+THUMB_QUALITY = int(os.environ.get("THUMB_QUALITY", "80"))
+THUMB_WORKERS = int(os.environ.get("THUMB_WORKERS", "4"))
+
+THUMB_PATH = os.path.join(OUT_DIR, THUMB_DIR)
+THUMB_INDEX_PATH = os.path.join(OUT_DIR, THUMB_INDEX_JSON)
+
+# format -> (Pillow format name, file extension, mime type)
+_FORMATS = {
+    "webp": ("WEBP", "webp", "image/webp"),
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+    "jpg": ("JPEG", "jpg", "image/jpeg"),
+}
+
+_local = threading.local()
+
+
+def get_session() -> requests.Session:
+    # requests.Session is not guaranteed thread-safe; keep one per worker.
+    s = getattr(_local, "session", None)
+    if s is None:
+        s = requests.Session()
+        s.headers.update({"User-Agent": USER_AGENT})
+        _local.session = s
+    return s
+
+
+def variants_field_for(base: str) -> str:
+    return f"{base} thumbnail variants"
+
+
+def variants_on_disk(variants: list) -> bool:
+    if not variants:
+        return False
+    return all(
+        isinstance(v, dict) and os.path.exists(os.path.join(OUT_DIR, v.get("path", "")))
+        for v in variants
+    )
+
+
+def target_widths(src_width: int) -> list[int]:
+    # Never upscale; fall back to the original width if it is below every target.
+    widths = [w for w in THUMB_WIDTHS if w <= src_width]
+    return widths or [src_width]
+
+
+def render_variants(content: bytes) -> dict:
+    digest = hashlib.sha256(content).hexdigest()[:16]
+
+    with Image.open(io.BytesIO(content)) as im:
+        im.load()
+        src_w, src_h = im.size
+        if im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+
+        variants = []
+        for width in target_widths(src_w):
+            height = max(1, round(src_h * width / src_w))
+            resized = None
+            for fmt in THUMB_FORMATS:
+                pil_format, ext, mime = _FORMATS[fmt]
+                rel_path = f"{THUMB_DIR}/{digest}-{width}.{ext}"
+                abs_path = os.path.join(OUT_DIR, rel_path)
+                if not os.path.exists(abs_path):
+                    if resized is None:
+                        resized = im if width == src_w else im.resize((width, height), Image.LANCZOS)
+                    # Unique temp name: two workers may render the same bytes from different URLs
+                    fd, tmp = tempfile.mkstemp(dir=THUMB_PATH, suffix=".tmp")
+                    try:
+                        with os.fdopen(fd, "wb") as f:
+                            resized.save(f, format=pil_format, quality=THUMB_QUALITY)
+                        os.replace(tmp, abs_path)
+                    except BaseException:
+                        if os.path.exists(tmp):
+                            os.remove(tmp)
+                        raise
+                variants.append({
+                    "path": rel_path,
+                    "width": width,
+                    "height": height,
+                    "type": mime,
+                })
+
+    return {
+        "hash": digest,
+        "width": src_w,
+        "height": src_h,
+        "variants": variants,
+    }
+
+
+def mirror_thumbnail(url: str) -> dict:
+    r = get_session().get(url, timeout=TIMEOUT_SECS)
+    r.raise_for_status()
+    entry = render_variants(r.content)
+    entry["fetched_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    return entry
+
+
+def main():
+    unknown = [f for f in THUMB_FORMATS if f not in _FORMATS]
+    if unknown:
+        raise SystemExit(f"Unsupported THUMB_FORMATS: {', '.join(unknown)}")
+
+    enriched_output = load_json(OUT_PATH, default={})
+    index = load_json(THUMB_INDEX_PATH, default={})
+
+    if not isinstance(enriched_output, dict) or not isinstance(enriched_output.get("videos"), list):
+        raise SystemExit(f"{OUT_PATH} must be a JSON object with a videos array")
+    if not isinstance(index, dict):
+        raise SystemExit(f"{THUMB_INDEX_PATH} must be a JSON object")
+
+    os.makedirs(THUMB_PATH, exist_ok=True)
+
+    rows = enriched_output["videos"]
+    bases = [base_name_from_link_field(f) for f in VIDEO_LINK_FIELDS]
+
+    # Collect unique thumbnail URLs that are not mirrored yet
+    wanted = []
+    seen = set()
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        for base in bases:
+            thumb = str(row.get(f"{base} thumbnail", "") or "").strip()
+            if not thumb or thumb in seen:
+                continue
+            seen.add(thumb)
+            entry = index.get(thumb)
+            if isinstance(entry, dict) and variants_on_disk(entry.get("variants")):
+                continue
+            wanted.append(thumb)
+
+    print(f"Found {len(seen)} unique thumbnails, {len(wanted)} new to mirror.")
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, THUMB_WORKERS)) as pool:
+        futures = {pool.submit(mirror_thumbnail, url): url for url in wanted}
+        for i, fut in enumerate(as_completed(futures), 1):
+            url = futures[fut]
+            try:
+                index[url] = fut.result()
+                print(f"[{i}/{len(wanted)}] Mirrored: {url}")
+            except Exception as e:
+                failed += 1
+                print(f"[{i}/{len(wanted)}] Failed: {url} ({e})")
+
+    # Attach variants to rows
+    enriched = []
+    for row in rows:
+        if not isinstance(row, dict):
+            enriched.append(row)
+            continue
+        out = dict(row)
+        for base in bases:
+            thumb = str(row.get(f"{base} thumbnail", "") or "").strip()
+            entry = index.get(thumb) if thumb else None
+            field = variants_field_for(base)
+            if isinstance(entry, dict) and variants_on_disk(entry.get("variants")):
+                out[field] = entry["variants"]
+            else:
+                out.pop(field, None)
+        enriched.append(out)
+
+    if enriched != rows:
+        metadata = enriched_output.get("metadata")
+        if not isinstance(metadata, dict):
+            metadata = {}
+        metadata["last_updated"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        enriched_output["metadata"] = metadata
+        enriched_output["videos"] = enriched
+        save_json(OUT_PATH, enriched_output)
+        print("Wrote:", OUT_PATH)
+    else:
+        print("Thumbnail variants unchanged; kept", OUT_PATH)
+
+    save_json(THUMB_INDEX_PATH, index)
+    print("Wrote:", THUMB_INDEX_PATH)
+    if failed:
+        print(f"{failed} thumbnail(s) failed; they keep pointing at the remote original.")
+
+
+if __name__ == "__main__":
+    main()
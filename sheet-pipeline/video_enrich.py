@@ -3,30 +3,57 @@
 Enrich out.json with video titles + thumbnails, using a local cache.
 
 Inputs (defaults assume your existing pipeline output):
-  - /out/out.json
+  - /out/out.json  (or /out/out.ndjson with ROWS_FORMAT=ndjson, read row by row)
   - /out/video_info.json  (cache; created if missing)
 
 Outputs:
   - /out/out.enriched.json
   - /out/video_info.json  (updated)
 
+Fetch order and time budget:
+  URLs are fetched never-fetched first (before title retries), then newest
+  row Date/Added date first, then cheapest host first (Twitch batch lookups
+  and unknown hosts before YouTube/Twitch page fetches). With
+  FETCH_DEADLINE_SECS set, fetching stops once that many seconds have passed
+  since start; the rest is left for the next run and the partial results are
+  saved as usual.
+
+Crash safety:
+  Every fetch result is appended to /out/video_info.journal (one JSON line
+  per URL, flushed + fsynced) as soon as it completes. On startup the journal
+  is replayed into the cache, so an interrupted run resumes where it stopped.
+  Every JOURNAL_COMPACT_EVERY results, and at the end of a run, the cache is
+  saved and the journal truncated.
+  `python video_enrich.py fold-journal` only folds a leftover journal into the
+  cache, without fetching (CI runs it after a failed or cancelled job).
+
 Fetch strategy:
   - YouTube: oEmbed title (with fallback to page og:title); deterministic i.ytimg.com thumbnails (maxres -> hq -> mq -> sd)
-  - Twitch VOD: scrape og:title + og:image from HTML
+  - Twitch VOD: batched GraphQL lookup (many VODs per request: title, thumbnail, duration, availability),
+    falling back to scraping og:title + og:image from HTML
 
 Config via env:
   OUT_DIR=/out
-  IN_JSON=out.json
+  ROWS_FORMAT=json                                 # ndjson -> IN_JSON defaults to out.ndjson
+  IN_JSON=out.json                                 # override the rows file explicitly
   OUT_JSON=out.enriched.json
   CACHE_JSON=video_info.json
+  JOURNAL_FILE=video_info.journal
+  JOURNAL_COMPACT_EVERY=50
+  FETCH_DEADLINE_SECS=0                            # 0 = no time budget
   VIDEO_LINK_FIELDS="timestamp 1 link,ts 2 link"   # fields in out.json to treat as URLs
   SLEEP_SECS=0.2
   TIMEOUT_SECS=20
   USER_AGENT="Mozilla/5.0 ..."
+  TWITCH_BATCH=1                                   # 0 = og scraping only
+  TWITCH_BATCH_SIZE=25
+  TWITCH_GQL_URL=https://gql.twitch.tv/gql         # point at a local stand-in server for testing
+  TWITCH_CLIENT_ID=...
 """
 
 import os
 import re
+import sys
 import json
 import time
 import html
@@ -37,11 +64,18 @@ from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 
 import requests
 
+from profiling import StageProfiler
+from rows_io import load_rows
 
 OUT_DIR = os.environ.get("OUT_DIR", "/out")
-IN_JSON = os.environ.get("IN_JSON", "out.json")
+ROWS_FORMAT = os.environ.get("ROWS_FORMAT", "json").lower()
+# Read whichever file pipeline.py wrote for ROWS_FORMAT unless IN_JSON says otherwise
+IN_JSON = os.environ.get("IN_JSON") or ("out.ndjson" if ROWS_FORMAT == "ndjson" else "out.json")
 OUT_JSON = os.environ.get("OUT_JSON", "out.enriched.json")
 CACHE_JSON = os.environ.get("CACHE_JSON", "video_info.json")
+JOURNAL_FILE = os.environ.get("JOURNAL_FILE", "video_info.journal")
+JOURNAL_COMPACT_EVERY = int(os.environ.get("JOURNAL_COMPACT_EVERY", "50"))
+FETCH_DEADLINE_SECS = float(os.environ.get("FETCH_DEADLINE_SECS", "0"))
 
 VIDEO_LINK_FIELDS = [s.strip() for s in os.environ.get(
     "VIDEO_LINK_FIELDS", "timestamp 1 link,ts 2 link"
@@ -54,9 +88,16 @@ USER_AGENT = os.environ.get(
     "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122 Safari/537.36"
 )
 
+TWITCH_BATCH = os.environ.get("TWITCH_BATCH", "1") not in {"0", "false", "no", ""}
+TWITCH_BATCH_SIZE = int(os.environ.get("TWITCH_BATCH_SIZE", "25"))
+TWITCH_GQL_URL = os.environ.get("TWITCH_GQL_URL", "https://gql.twitch.tv/gql")
+# Public client id used by the twitch.tv web player
+TWITCH_CLIENT_ID = os.environ.get("TWITCH_CLIENT_ID", "kimne78kx3ncx6brgo4mv6wki5h1ko")
+
 IN_PATH = os.path.join(OUT_DIR, IN_JSON)
 OUT_PATH = os.path.join(OUT_DIR, OUT_JSON)
 CACHE_PATH = os.path.join(OUT_DIR, CACHE_JSON)
+JOURNAL_PATH = os.path.join(OUT_DIR, JOURNAL_FILE)
 
 session = requests.Session()
 session.headers.update({
@@ -80,6 +121,73 @@ def save_json(path, obj):
     os.replace(tmp, path)
 
 
+class FetchJournal:
+    """
+    Append-only log of fetch results, folded back into the cache file.
+
+    Lines are {"url": ..., "info": {...}}. A torn last line (crash mid-write)
+    is ignored on replay. Compaction saves the cache first and only then
+    truncates the journal, so a crash in between just replays entries that
+    are already in the cache.
+    """
+
+    def __init__(self, path: str, cache_path: str, cache: dict, compact_every: int):
+        self.path = path
+        self.cache_path = cache_path
+        self.cache = cache
+        self.compact_every = compact_every
+        self.pending = 0
+        self._f = None
+
+    def replay(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        n = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict) and isinstance(entry.get("info"), dict) and entry.get("url"):
+                    self.cache[entry["url"]] = entry["info"]
+                    n += 1
+        self.pending = n
+        return n
+
+    def record(self, url: str, info: dict):
+        self.cache[url] = info
+        if self._f is None:
+            self._f = open(self.path, "a", encoding="utf-8")
+        self._f.write(json.dumps({"url": url, "info": info}, ensure_ascii=False) + "\n")
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self.pending += 1
+        if self.compact_every > 0 and self.pending >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        if not self.pending:
+            return
+        save_json(self.cache_path, self.cache)
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        with open(self.path, "w", encoding="utf-8"):
+            pass
+        self.pending = 0
+
+    def close(self):
+        # Final fold: always write the cache, then drop the journal
+        save_json(self.cache_path, self.cache)
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.pending = 0
+
+
 def has_text(value) -> bool:
     return isinstance(value, str) and bool(value.strip())
 
@@ -196,7 +304,7 @@ _YOUTUBE_UNAVAILABLE_TITLE_RE = re.compile(
     r"^(video unavailable|this video is unavailable|this video is private)(?:\b|$)",
     re.IGNORECASE,
 )
-_YOUTUBE_UNAVAILABLE_MARKERS = (
+YOUTUBE_UNAVAILABLE_MARKERS = (
     '"playabilityStatus":{"status":"ERROR"',
     '"playabilityStatus":{"status":"UNPLAYABLE"',
     '"playabilityStatus":{"status":"LOGIN_REQUIRED"',
@@ -228,7 +336,7 @@ def youtube_page_meta(url: str) -> tuple[str | None, bool]:
     unavailable = False
     if isinstance(title, str) and _YOUTUBE_UNAVAILABLE_TITLE_RE.search(title):
         unavailable = True
-    if any(marker in t for marker in _YOUTUBE_UNAVAILABLE_MARKERS):
+    if any(marker in t for marker in YOUTUBE_UNAVAILABLE_MARKERS):
         unavailable = True
 
     return title, unavailable
@@ -297,12 +405,129 @@ def twitch_vod_meta(url: str) -> tuple[str | None, str | None]:
     return title, thumb
 
 
+_TWITCH_VOD_ID_RE = re.compile(r"/videos?/(\d+)")
+
+
+def twitch_vod_id(url: str) -> str | None:
+    if not is_twitch(url):
+        return None
+    m = _TWITCH_VOD_ID_RE.search(urlparse(url).path)
+    return m.group(1) if m else None
+
+
+def twitch_vod_meta_batch(vod_ids: list[str]) -> dict:
+    """
+    Resolve many Twitch VODs with a single GraphQL request (one aliased field per id).
+
+    Returns {vod_id: meta}, where meta is None when Twitch reports the VOD as
+    missing (deleted/expired), otherwise a dict with title, thumbnail,
+    duration_secs and status. Ids whose alias failed (null plus an entry in
+    the GraphQL errors array) are left out, so callers treat them as unanswered.
+    Raises on transport errors or malformed responses so callers can fall back.
+    """
+    if not vod_ids:
+        return {}
+    fields = " ".join(
+        f'v{i}: video(id: "{vid}") '
+        "{ id title lengthSeconds status previewThumbnailURL(width: 640, height: 360) }"
+        for i, vid in enumerate(vod_ids)
+    )
+    r = session.post(
+        TWITCH_GQL_URL,
+        json={"query": f"query {{ {fields} }}"},
+        headers={"Client-Id": TWITCH_CLIENT_ID},
+        timeout=TIMEOUT_SECS,
+    )
+    r.raise_for_status()
+    body = r.json()
+    data = body.get("data")
+    if not isinstance(data, dict):
+        raise ValueError("Twitch GraphQL response has no data")
+
+    # Partial errors: a failed alias comes back null with an error naming it
+    failed = set()
+    for err in body.get("errors") or ():
+        path = err.get("path") if isinstance(err, dict) else None
+        if isinstance(path, list) and path:
+            failed.add(path[0])
+        else:
+            failed.add(None)  # error not tied to an alias: no null can be trusted
+
+    out = {}
+    for i, vid in enumerate(vod_ids):
+        alias = f"v{i}"
+        if alias not in data:
+            raise ValueError(f"Twitch GraphQL response is missing {alias}")
+        video = data[alias]
+        if not isinstance(video, dict):
+            if alias in failed or None in failed:
+                continue
+            out[vid] = None
+            continue
+        title = video.get("title")
+        out[vid] = {
+            "title": title.strip() if isinstance(title, str) and title.strip() else None,
+            "thumbnail": sanitize_twitch_thumbnail(video.get("previewThumbnailURL")),
+            "duration_secs": video.get("lengthSeconds"),
+            "status": video.get("status"),
+        }
+    return out
+
+
+def fetch_twitch_batch(urls: list[str], on_result=None, deadline: float | None = None) -> dict:
+    """
+    Batch-fetch Twitch VOD URLs. Returns {url: info} only for URLs the batch
+    endpoint answered; everything else is left for per-URL og scraping.
+    on_result(url, info) is called as each batch completes. No new batch is
+    started after the time.monotonic() deadline.
+    """
+    by_id = {}
+    for url in urls:
+        vid = twitch_vod_id(url)
+        if vid:
+            by_id.setdefault(vid, []).append(url)
+
+    ids = list(by_id)
+    results = {}
+    for start in range(0, len(ids), max(1, TWITCH_BATCH_SIZE)):
+        chunk = ids[start:start + max(1, TWITCH_BATCH_SIZE)]
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        try:
+            metas = twitch_vod_meta_batch(chunk)
+        except Exception as e:
+            print(f"Twitch batch of {len(chunk)} failed ({e}); falling back to og scraping.")
+            continue
+        fetched_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        unanswered = [vid for vid in chunk if vid not in metas]
+        if unanswered:
+            print(f"Twitch batch: {len(unanswered)} VOD(s) errored; falling back to og scraping.")
+        for vid in chunk:
+            if vid not in metas:
+                continue
+            meta = metas[vid]
+            if meta is None:
+                info = {"title": None, "thumbnail": None, "source": "twitch_unavailable"}
+            else:
+                info = dict(meta, source="twitch_gql")
+            info["fetched_at"] = fetched_at
+            for url in by_id[vid]:
+                results[url] = dict(info)
+                if on_result:
+                    on_result(url, results[url])
+        time.sleep(SLEEP_SECS)
+    return results
+
+
 def fetch_video_info(url: str) -> dict:
     """
     Returns dict with keys:
       - title (optional)
       - thumbnail (optional)
       - source (youtube_oembed / youtube_oembed_watch / youtube_page_og / youtube_unavailable / youtube_thumb / twitch_og / unknown)
+
+    Twitch VODs are normally resolved up front by fetch_twitch_batch()
+    (twitch_gql / twitch_unavailable); this is the per-URL og fallback.
     """
     info = {"title": None, "thumbnail": None, "source": None}
 
@@ -396,31 +621,86 @@ def should_skip_old_twitch_vod(row: dict, url: str) -> bool:
     return d < cutoff
 
 
+def fetch_cost(url: str) -> int:
+    """Relative request cost used to order fetches (lower goes first)."""
+    if TWITCH_BATCH and twitch_vod_id(url):
+        return 0  # shares one request with up to TWITCH_BATCH_SIZE others
+    if is_youtube(url):
+        return 2  # thumbnail HEAD probes + oEmbed, maybe a page fetch
+    if is_twitch(url):
+        return 1
+    return 0  # unknown hosts are not fetched at all
+
+
+def fetch_priority(url: str, cache: dict, url_date: dict) -> tuple:
+    newest = url_date.get(url) or date.min
+    return (url in cache, -newest.toordinal(), fetch_cost(url))
+
+
+def existing_thumbnail_variants(existing_output) -> dict:
+    """
+    Map thumbnail URL -> variants list from a previous out.enriched.json,
+    as written by thumbnail_mirror.py.
+    """
+    variants = {}
+    videos = existing_output.get("videos") if isinstance(existing_output, dict) else None
+    if not isinstance(videos, list):
+        return variants
+    for row in videos:
+        if not isinstance(row, dict):
+            continue
+        for field in VIDEO_LINK_FIELDS:
+            thumb_field = f"{base_name_from_link_field(field)} thumbnail"
+            thumb = row.get(thumb_field)
+            found = row.get(f"{thumb_field} variants")
+            if has_text(thumb) and isinstance(found, list) and found:
+                variants[thumb] = found
+    return variants
+
+
 def main():
-    rows = load_json(IN_PATH, default=[])
+    if not os.path.exists(IN_PATH):
+        # An empty out.enriched.json would empty the site; keep the previous one
+        raise SystemExit(f"{IN_PATH} not found; run pipeline.py first (ROWS_FORMAT={ROWS_FORMAT})")
+    deadline = time.monotonic() + FETCH_DEADLINE_SECS if FETCH_DEADLINE_SECS > 0 else None
+    prof = StageProfiler("video_enrich", OUT_DIR)
+    prof.stage("load")
     cache = load_json(CACHE_PATH, default={})
     existing_output = load_json(OUT_PATH, default={})
 
     if not isinstance(cache, dict):
         raise SystemExit("video_info.json must be a JSON object (map of url -> info)")
 
+    journal = FetchJournal(JOURNAL_PATH, CACHE_PATH, cache, JOURNAL_COMPACT_EVERY)
+    replayed = journal.replay()
+    if replayed:
+        print(f"Replayed {replayed} fetch result(s) from {JOURNAL_PATH} (resuming interrupted run).")
+
     for cached_url, cached_info in cache.items():
         if not (isinstance(cached_info, dict) and is_twitch(cached_url)):
             continue
         cached_info["thumbnail"] = sanitize_twitch_thumbnail(cached_info.get("thumbnail"))
 
+    existing_variants = existing_thumbnail_variants(existing_output)
+    in_rows = load_rows(IN_PATH)
+
     # Collect unique URLs to fetch
+    prof.stage("collect")
     wanted = []
     seen = set()
     url_skip = {}
+    url_date = {}
 
-    for row in rows:
+    for row in in_rows:
         if not isinstance(row, dict):
             continue
+        row_date = parse_iso_date(row.get("Date")) or parse_iso_date(row.get("Added date"))
         for field in VIDEO_LINK_FIELDS:
             url = normalize_url(str(row.get(field, "") or ""))
             if not url:
                 continue
+            if row_date and (url not in url_date or row_date > url_date[url]):
+                url_date[url] = row_date
             if url in seen:
                 skip = should_skip_old_twitch_vod(row, url)
                 url_skip[url] = url_skip.get(url, True) and skip
@@ -445,26 +725,46 @@ def main():
         for u in skipped:
             print(f"  - {u}")
 
+    # Most visible first: new URLs, newest rows, cheapest hosts
+    wanted.sort(key=lambda u: fetch_priority(u, cache, url_date))
+
+    prof.stage("fetch")
+    # Resolve Twitch VODs in batches first; anything unanswered falls through to og scraping
+    if TWITCH_BATCH:
+        batched = fetch_twitch_batch(
+            [u for u in wanted if twitch_vod_id(u)], on_result=journal.record, deadline=deadline
+        )
+        if batched:
+            print(f"Resolved {len(batched)} Twitch URLs via batch lookup.")
+        wanted = [u for u in wanted if u not in batched]
+
     # Fetch new ones with light throttling
     for i, url in enumerate(wanted, 1):
+        if deadline is not None and time.monotonic() >= deadline:
+            print(
+                f"Fetch deadline of {FETCH_DEADLINE_SECS:g}s reached; "
+                f"deferring {len(wanted) - i + 1} URL(s) to the next run."
+            )
+            break
         print(f"[{i}/{len(wanted)}] Fetching: {url}")
         try:
             info = fetch_video_info(url)
             info["fetched_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-            cache[url] = info
         except Exception as e:
-            cache[url] = {
+            info = {
                 "title": None,
                 "thumbnail": None,
                 "source": "error",
                 "error": str(e),
                 "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
             }
+        journal.record(url, info)
         time.sleep(SLEEP_SECS)
 
     # Enrich rows
+    prof.stage("enrich")
     enriched = []
-    for row in rows:
+    for row in in_rows:
         if not isinstance(row, dict):
             enriched.append(row)
             continue
@@ -491,6 +791,11 @@ def main():
             out[title_field] = info.get("title") or ""
             out[thumb_field] = info.get("thumbnail") or ""
 
+            # Keep variants written by thumbnail_mirror.py while the thumbnail is unchanged
+            variants = existing_variants.get(out[thumb_field])
+            if variants:
+                out[f"{thumb_field} variants"] = variants
+
         enriched.append(out)
 
     existing_videos = []
@@ -518,7 +823,8 @@ def main():
         },
     }
 
-    save_json(CACHE_PATH, cache)
+    prof.stage("save")
+    journal.close()
     save_json(OUT_PATH, enriched_output)
 
     print("Wrote:", CACHE_PATH)
@@ -527,7 +833,24 @@ def main():
         print("Videos changed; updated metadata.last_updated.")
     else:
         print("Videos unchanged; kept existing metadata.last_updated.")
+    prof.finish()
+
+
+def fold_journal():
+    cache = load_json(CACHE_PATH, default={})
+    if not isinstance(cache, dict):
+        raise SystemExit("video_info.json must be a JSON object (map of url -> info)")
+    if not os.path.exists(JOURNAL_PATH):
+        print(f"No journal at {JOURNAL_PATH}; nothing to fold.")
+        return
+    journal = FetchJournal(JOURNAL_PATH, CACHE_PATH, cache, JOURNAL_COMPACT_EVERY)
+    replayed = journal.replay()
+    journal.close()
+    print(f"Folded {replayed} fetch result(s) from {JOURNAL_PATH} into {CACHE_PATH}")
 
 
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:] == ["fold-journal"]:
+        fold_journal()
+    else:
+        main()
@@ -5,6 +5,14 @@ export default function (eleventyConfig) {
   );
 
   eleventyConfig.addPassthroughCopy("src/assets");
+  // Static search index written by sheet-pipeline/search_index.py
+  eleventyConfig.addPassthroughCopy({
+    [process.env.SEARCH_DIR_PATH || "../data/search"]: "search"
+  });
+  // Optional local thumbnail mirror written by sheet-pipeline/thumbnail_mirror.py
+  eleventyConfig.addPassthroughCopy({
+    [process.env.THUMBS_DIR_PATH || "../data/thumbs"]: "thumbs"
+  });
 
   return {
     dir: {
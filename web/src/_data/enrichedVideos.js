@@ -32,6 +32,23 @@ function readEnrichedFile() {
   }
 }
 
+function buildSrcset(variants, type) {
+  return variants
+    .filter((variant) => variant && variant.type === type && variant.path && variant.width)
+    .map((variant) => `/${variant.path} ${variant.width}w`)
+    .join(", ");
+}
+
+function normalizeThumbnailVariants(variants) {
+  const list = Array.isArray(variants) ? variants : [];
+  const jpegs = list.filter((variant) => variant && variant.type === "image/jpeg" && variant.path);
+  return {
+    src: jpegs.length ? `/${jpegs[jpegs.length - 1].path}` : "",
+    webp: buildSrcset(list, "image/webp"),
+    jpeg: buildSrcset(list, "image/jpeg")
+  };
+}
+
 function normalizeVideo(video) {
   const creatorName = (video["Creator"] || "").trim();
   return {
@@ -44,6 +61,7 @@ function normalizeVideo(video) {
     timestamp1: {
       link: video["timestamp 1 link"] || "",
       thumbnail: video["timestamp 1 thumbnail"] || "",
+      thumbnailVariants: normalizeThumbnailVariants(video["timestamp 1 thumbnail variants"]),
       title: video["timestamp 1 title"] || ""
     },
     timestamp2: {
@@ -261,6 +261,13 @@
     const currentSrc = image.getAttribute("src") || "";
     const fallback = pickRandomFallback(currentSrc);
     image.dataset.fallbackApplied = "true";
+    // Mirrored thumbnails use <picture>/srcset, which the browser prefers over src
+    const picture = image.closest("picture");
+    if (picture) {
+      picture.querySelectorAll("source").forEach((source) => source.remove());
+    }
+    image.removeAttribute("srcset");
+    image.removeAttribute("sizes");
     image.src = fallback;
   }
 